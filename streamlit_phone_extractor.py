@@ -1,6 +1,8 @@
 # streamlit_app.py
+import hashlib
 import re
 from io import BytesIO
+import numpy as np
 import pandas as pd
 import streamlit as st
 
@@ -19,7 +21,8 @@ st.caption("Upload an Excel or enter numbers manually. Extract Egyptian mobile n
 # -----------------------------
 # Helpers: numbers & links
 # -----------------------------
-EG_MOBILE_REGEX = re.compile(r'(?:\+?20)?0?1\d{9}')  # handles +20 / 20 / 01 prefixes
+# Optional +20 / 20 / 0 prefix, then the 10-digit national number (1XXXXXXXXX).
+EG_MOBILE_REGEX = re.compile(r"(?:\+?20|0)?(?P<national>1\d{9})")
 
 def find_egypt_mobile(text: str) -> str | None:
     """
@@ -29,28 +32,16 @@ def find_egypt_mobile(text: str) -> str | None:
     """
     if text is None:
         return None
-    s = str(text)
-
-    m = EG_MOBILE_REGEX.search(s)
-    if not m:
-        return None
-
-    digits = re.sub(r"\D", "", m.group())
-
-    # Normalize to international digits-only:
-    if digits.startswith("0") and len(digits) == 11:
-        digits = "20" + digits[1:]
-    elif digits.startswith("20") and len(digits) == 12:
-        pass
-    elif digits.startswith("1") and len(digits) == 10:
-        digits = "20" + digits
-    else:
+    s = str(text).strip()
+    if "1" not in s:  # every match contains a 1; skip the regex for the rest
         return None
 
-    if not (digits.startswith("201") and len(digits) == 12):
+    # Most inputs are just the number: try the anchored match before scanning the text.
+    m = EG_MOBILE_REGEX.fullmatch(s) or EG_MOBILE_REGEX.search(s)
+    if not m:
         return None
 
-    return digits  # e.g., 2010XXXXXXXX
+    return "20" + m.group("national")  # e.g., 2010XXXXXXXX
 
 
 def build_output_df(raw_series: pd.Series) -> pd.DataFrame:
@@ -61,20 +52,35 @@ def build_output_df(raw_series: pd.Series) -> pd.DataFrame:
     - Completed: False
     Deduplicates by Phone Number.
     """
-    rows = []
-    for val in raw_series:
-        digits = find_egypt_mobile(val)
-        if digits:
-            rows.append({
-                "Phone Number": f"+{digits}",
-                "WhatsApp Link": f"https://wa.me/{digits}",
-                "Completed": False
-            })
-
-    df = pd.DataFrame(rows, columns=["Phone Number", "WhatsApp Link", "Completed"])
-    if not df.empty:
-        df = df.drop_duplicates(subset=["Phone Number"]).reset_index(drop=True)
-    return df
+    s = raw_series
+    if not isinstance(s.dtype, pd.StringDtype):
+        s = s.astype("string")
+    s = s[s.str.contains("1", regex=False, na=False)]
+    national = s.str.extract(EG_MOBILE_REGEX, expand=False).dropna()
+    # Dedupe first so the prefixes are only joined for unique numbers; the joins run on
+    # fixed-width NumPy strings rather than per-object pandas string ops.
+    national = national.drop_duplicates().to_numpy(dtype="U10")
+    return output_df_from_digits(np.char.add("20", national))
+
+
+def extract_digits(lines) -> list[str]:
+    """
+    Extract digits-only numbers (201XXXXXXXXX) from an iterable of strings, deduped in order.
+    For small inputs like a manual paste, where building a Series costs more than it saves.
+    """
+    return list(dict.fromkeys(d for ln in lines if (d := find_egypt_mobile(ln))))
+
+
+def output_df_from_digits(digits) -> pd.DataFrame:
+    """Build the Phone Number / WhatsApp Link / Completed frame from unique 201XXXXXXXXX strings."""
+    digits = np.asarray(digits, dtype="U12")
+
+    # Plain column arrays: no per-row dicts and no index alignment in the constructor.
+    return pd.DataFrame({
+        "Phone Number": np.char.add("+", digits),
+        "WhatsApp Link": np.char.add("https://wa.me/", digits),
+        "Completed": np.zeros(len(digits), dtype=bool),
+    })
 
 
 def dataframe_to_excel_bytes(df: pd.DataFrame, make_clickable=False) -> bytes:
@@ -82,24 +88,102 @@ def dataframe_to_excel_bytes(df: pd.DataFrame, make_clickable=False) -> bytes:
     Build an in-memory XLSX. Optionally replace WhatsApp Link with Excel HYPERLINK formula.
     Only two columns are exported: Phone Number, WhatsApp Link.
     """
-    out_df = df.copy()
-    out_df = out_df[["Phone Number", "WhatsApp Link"]]
+    out_df = df[["Phone Number", "WhatsApp Link"]]
 
     if make_clickable:
-        out_df["WhatsApp Link"] = out_df["WhatsApp Link"].apply(
-            lambda url: f'=HYPERLINK("{url}", "Open WhatsApp")'
-        )
+        out_df = out_df.assign(**{
+            "WhatsApp Link": '=HYPERLINK("' + out_df["WhatsApp Link"] + '", "Open WhatsApp")'
+        })
 
     buffer = BytesIO()
-    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+    # xlsxwriter streams the XML instead of building an openpyxl object graph.
+    # Keep plain links as text; the HYPERLINK formula is the opt-in clickable form.
+    with pd.ExcelWriter(
+        buffer,
+        engine="xlsxwriter",
+        engine_kwargs={"options": {"strings_to_urls": False}},
+    ) as writer:
         out_df.to_excel(writer, index=False, sheet_name="WhatsApp")
     buffer.seek(0)
     return buffer.getvalue()
 
 
+# -----------------------------
+# Helpers: cached loading
+# -----------------------------
+def get_excel_file(file_bytes: bytes, file_key: str) -> pd.ExcelFile:
+    """
+    Open the uploaded workbook once per upload and keep it in session state, so reruns
+    and sheet switches reuse it instead of re-opening the workbook.
+    """
+    if st.session_state.get("xls_key") != file_key:
+        # Open first: if the new upload is unreadable, the previous handle stays usable.
+        xls = pd.ExcelFile(BytesIO(file_bytes))
+        if "xls" in st.session_state:
+            st.session_state["xls"].close()
+        st.session_state["xls"] = xls
+        st.session_state["xls_key"] = file_key
+    return st.session_state["xls"]
+
+
+# Cached on the upload's SHA-1 digest (file_key), not its bytes, so widget reruns
+# (toggles, checkbox edits) skip both the re-parse and re-hashing the workbook.
+@st.cache_data(show_spinner=False)
+def load_preview(file_key: str, sheet: str, _xls: pd.ExcelFile, nrows: int = 20) -> pd.DataFrame:
+    """Read the first rows of one sheet (cells as text) for the preview and column picker."""
+    return pd.read_excel(_xls, sheet_name=sheet, dtype=str, nrows=nrows)
+
+
+def read_column(xls: pd.ExcelFile, sheet: str, col_idx: int) -> pd.Series:
+    """
+    Stream a single column (below the header row) from the already-open workbook.
+    For xlsx, pandas opened it with openpyxl in read-only mode, so memory stays O(row)
+    instead of materializing the whole sheet. Legacy .xls goes through pd.read_excel.
+    """
+    if xls.engine != "openpyxl":
+        df = pd.read_excel(xls, sheet_name=sheet, dtype=str, usecols=[col_idx])
+        return df.iloc[:, 0]  # build_output_df converts to the string dtype
+
+    ws = xls.book[sheet]
+    # Read-only mode trusts the sheet's <dimension> tag, which some exporters leave stale.
+    ws.reset_dimensions()
+    rows = ws.iter_rows(min_row=2, min_col=col_idx + 1, max_col=col_idx + 1, values_only=True)
+    return pd.Series([row[0] for row in rows], dtype="string")
+
+
+@st.cache_data(show_spinner=False)
+def extract_from_sheet(file_key: str, sheet: str, col_idx: int, _xls: pd.ExcelFile) -> pd.DataFrame:
+    """build_output_df for one column (0-based position) of one sheet."""
+    return build_output_df(read_column(_xls, sheet, col_idx))
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def cached_excel_bytes(export_digest: str, _export_df: pd.DataFrame, make_clickable: bool) -> bytes:
+    """dataframe_to_excel_bytes keyed on a digest of the data (the _-prefixed frame isn't hashed)."""
+    return dataframe_to_excel_bytes(_export_df, make_clickable=make_clickable)
+
+
+def excel_bytes_for_download(df: pd.DataFrame, make_clickable=False) -> bytes:
+    """
+    Serialize the exported columns once per (content, clickable) pair, so flipping the
+    toggle back or ticking Completed reuses the workbook instead of rebuilding it.
+    """
+    export_df = df[["Phone Number", "WhatsApp Link"]]
+    row_hashes = pd.util.hash_pandas_object(export_df, index=False).to_numpy()
+    digest = hashlib.sha1(row_hashes.tobytes()).hexdigest()
+    return cached_excel_bytes(digest, export_df, make_clickable)
+
+
 # -----------------------------
 # UI - Tabs for flows
 # -----------------------------
+# Shared by both tabs.
+RESULT_COLUMN_CONFIG = {
+    "WhatsApp Link": st.column_config.LinkColumn("WhatsApp Link", help="Open WhatsApp chat"),
+    "Completed": st.column_config.CheckboxColumn("Completed", help="Mark as processed"),
+}
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
 tab_upload, tab_manual = st.tabs(["📤 Upload Excel", "📝 Manual Entry"])
 
 # ==========================================
@@ -111,12 +195,14 @@ with tab_upload:
 
     if file:
         try:
-            xls = pd.ExcelFile(file)
+            file_bytes = file.getvalue()
+            file_key = hashlib.sha1(file_bytes).hexdigest()
+            xls = get_excel_file(file_bytes, file_key)
             sheet = st.selectbox("Select sheet", xls.sheet_names, index=0)
-            df = pd.read_excel(xls, sheet_name=sheet, dtype=str)
+            df = load_preview(file_key, sheet, xls)
 
             st.write("Preview:")
-            st.dataframe(df.head(20), width="stretch")
+            st.dataframe(df, width="stretch")
 
             if df.shape[1] < 2:
                 st.warning("The original script expected **phone numbers in the 2nd column**. Select the correct column below.")
@@ -124,7 +210,7 @@ with tab_upload:
             col_name = st.selectbox("Which column contains phone numbers?", df.columns, index=default_col_idx)
 
             # Process
-            result_df = build_output_df(df[col_name])
+            result_df = extract_from_sheet(file_key, sheet, df.columns.get_loc(col_name), xls)
 
             c1 = st.columns(1)[0]
             with c1:
@@ -139,23 +225,20 @@ with tab_upload:
                 width="stretch",
                 num_rows="fixed",
                 hide_index=True,
-                column_config={
-                    "WhatsApp Link": st.column_config.LinkColumn("WhatsApp Link", help="Open WhatsApp chat"),
-                    "Completed": st.column_config.CheckboxColumn("Completed", help="Mark as processed"),
-                },
+                column_config=RESULT_COLUMN_CONFIG,
             )
 
             st.divider()
             st.subheader("Download")
 
             make_clickable = st.toggle("Make Excel links clickable (Excel HYPERLINK formula)", value=True)
-            excel_bytes = dataframe_to_excel_bytes(edited_df, make_clickable=make_clickable)
+            excel_bytes = excel_bytes_for_download(edited_df, make_clickable=make_clickable)
 
             st.download_button(
                 label="⬇️ Download processed Excel (2 columns)",
                 data=excel_bytes,
                 file_name="processed_whatsapp.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                mime=XLSX_MIME,
             )
         except Exception as e:
             st.error(f"Error reading file: {e}")
@@ -177,9 +260,8 @@ with tab_manual:
         st.caption("Click **Parse numbers** to extract, clean, and build WhatsApp links.")
 
     if parse_btn and raw_text.strip():
-        lines = [ln for ln in raw_text.splitlines() if ln.strip()]
-        series = pd.Series(lines, dtype="string")
-        manual_df = build_output_df(series)
+        lines = [ln for ln in raw_text.splitlines() if "1" in ln]
+        manual_df = output_df_from_digits(extract_digits(lines))
 
         if manual_df.empty:
             st.warning("No valid Egyptian mobile numbers found.")
@@ -195,22 +277,19 @@ with tab_manual:
                 width="stretch",
                 num_rows="dynamic",
                 hide_index=True,
-                column_config={
-                    "WhatsApp Link": st.column_config.LinkColumn("WhatsApp Link", help="Open WhatsApp chat"),
-                    "Completed": st.column_config.CheckboxColumn("Completed", help="Mark as processed"),
-                },
+                column_config=RESULT_COLUMN_CONFIG,
             )
 
             st.divider()
             st.subheader("Download")
             make_clickable_2 = st.toggle("Make Excel links clickable (Excel HYPERLINK formula)", key="clickable2", value=True)
-            excel_bytes_2 = dataframe_to_excel_bytes(editable_df, make_clickable=make_clickable_2)
+            excel_bytes_2 = excel_bytes_for_download(editable_df, make_clickable=make_clickable_2)
 
             st.download_button(
                 label="⬇️ Download processed Excel (2 columns)",
                 data=excel_bytes_2,
                 file_name="processed_whatsapp_manual.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                mime=XLSX_MIME,
             )
 
     with st.expander("ℹ️ What numbers are supported?"):